@@ -1,9 +1,13 @@
 from enum import Enum
 
 class CSVAdjustFieldType(Enum):
-    """Enumeration of the valid kinds of required fields a conditional can have"""
+    """Enumeration of the valid kinds of fields a conditional can have"""
     COLUMN_NUMBER = ("columnnumber")
     VALUE = ("value")
+    CACHE_SIZE = ("cachesize")
+    CONDITIONALS = ("conditionals")
     
     def __init__(self, jsonName):
-        self.jsonName = jsonName
\ No newline at end of file
+        self.jsonName = jsonName
+
+from .plan import AdjustPlan
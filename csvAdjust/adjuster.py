@@ -0,0 +1,554 @@
+import csv, io, os, logging, threading, queue, time
+from .config import ConfigSection
+from .plan import AdjustPlan
+from . import reader
+from .checkpoint import Checkpoint
+
+class _LineSource(object):
+    """Hands decoded lines from a binary file to the csv reader while keeping track of how many bytes have been
+    consumed. The csv reader only pulls the lines it needs for the current record, so after each row the offset
+    points at the start of the next one."""
+
+    def __init__(self, handle, encoding):
+        self.handle = handle
+        self.encoding = encoding
+        self.offset = handle.tell()
+
+    def __iter__(self):
+        for line in self.handle:
+            self.offset += len(line)
+            yield line.decode(self.encoding)
+
+class _EncodedWriter(object):
+    """Wraps a binary file so a csv writer can write to it. Rows are buffered as text and encoded in batches,
+    and the byte offset of everything handed to the file is tracked for checkpoints."""
+
+    #Number of characters buffered before they are encoded and written out
+    BUFFER_SIZE = 65536
+
+    def __init__(self, handle, encoding, dialect):
+        self.handle = handle
+        self.encoding = encoding
+        self.offset = handle.tell()
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer, dialect=dialect)
+
+    def writerow(self, row):
+        self.writer.writerow(row)
+
+        if self.buffer.tell() >= _EncodedWriter.BUFFER_SIZE:
+            self.flush()
+
+    def flush(self):
+        """Writes out anything buffered and returns the byte offset the file is at"""
+        data = self.buffer.getvalue().encode(self.encoding)
+        if data:
+            self._write(data)
+            self.offset += len(data)
+            self.buffer.seek(0)
+            self.buffer.truncate()
+
+        return self.offset
+
+    def when_written(self, action):
+        """Runs the action once everything flushed so far is in the file"""
+        action()
+
+    def sync(self):
+        """Makes sure everything flushed so far has reached the disk, not just the operating system"""
+        self.handle.flush()
+        os.fsync(self.handle.fileno())
+
+    def _write(self, data):
+        self.handle.write(data)
+        self.handle.flush()
+
+class _BlockReader(threading.Thread):
+    """Reader stage of the pipeline. Reads raw blocks from a binary file on its own thread so the disk keeps
+    working while rows are processed. An empty block means the end of the file."""
+
+    def __init__(self, handle, blocks, blockSize):
+        super().__init__(daemon=True)
+        self.handle = handle
+        self.blocks = blocks
+        self.blockSize = blockSize
+        self.busy = 0.0
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while True:
+                start = time.perf_counter()
+                block = self.handle.read(self.blockSize)
+                self.busy += time.perf_counter() - start
+
+                if not self._put(block) or not block:
+                    return
+        except Exception as e:
+            # The processing stage raises it when it gets to it
+            self._put(e)
+
+    def _put(self, item):
+        """Waits for room in the queue, giving up if the pipeline is stopped"""
+        while not self.stopped.is_set():
+            try:
+                self.blocks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+
+        return False
+
+    def stop(self):
+        self.stopped.set()
+
+class _BlockLineSource(object):
+    """Same as _LineSource, except the lines come from the blocks the reader stage has queued up. Blocks are cut
+    at their last newline byte, so just like _LineSource this needs an ASCII compatible encoding, which
+    _adjust_section checks before any file is opened"""
+
+    def __init__(self, blocks, encoding, offset):
+        self.blocks = blocks
+        self.encoding = encoding
+        self.offset = offset
+        self.waiting = 0.0
+
+    def __iter__(self):
+        remainder = b''
+        while True:
+            start = time.perf_counter()
+            block = self.blocks.get()
+            self.waiting += time.perf_counter() - start
+
+            if isinstance(block, Exception):
+                raise block
+
+            if not block:
+                break
+
+            # Only whole lines are handed out, the rest waits for the next block
+            data = remainder + block
+            end = data.rfind(b'\n') + 1
+            remainder = data[end:]
+
+            for line in io.BytesIO(data[:end]):
+                self.offset += len(line)
+                yield line.decode(self.encoding)
+
+        if remainder:
+            self.offset += len(remainder)
+            yield remainder.decode(self.encoding)
+
+class _BlockWriter(threading.Thread):
+    """Writer stage of the pipeline. Writes the encoded chunks the processing stage queues up, and runs any
+    actions queued between them once the chunks before them are in the file. None means there is nothing more."""
+
+    def __init__(self, handle, chunks):
+        super().__init__(daemon=True)
+        self.handle = handle
+        self.chunks = chunks
+        self.busy = 0.0
+        self.error = None
+
+    def run(self):
+        while True:
+            item = self.chunks.get()
+            if item is None:
+                break
+
+            # After a failure, keep emptying the queue so the processing stage never waits on it forever
+            if self.error is not None:
+                continue
+
+            start = time.perf_counter()
+            try:
+                if callable(item):
+                    self.handle.flush()
+                    item()
+                else:
+                    self.handle.write(item)
+            except BaseException as e:
+                self.error = e
+            self.busy += time.perf_counter() - start
+
+        if self.error is None:
+            try:
+                self.handle.flush()
+            except BaseException as e:
+                self.error = e
+
+class _QueuedWriter(_EncodedWriter):
+    """Same as _EncodedWriter, except the encoded chunks are handed to the writer stage instead of the file"""
+
+    def __init__(self, handle, encoding, dialect, chunks, stage):
+        super().__init__(handle, encoding, dialect)
+        self.chunks = chunks
+        self.stage = stage
+        self.waiting = 0.0
+
+    def when_written(self, action):
+        self._put(action)
+
+    def _write(self, data):
+        self._put(data)
+
+    def _put(self, item):
+        if self.stage.error is not None:
+            raise self.stage.error
+
+        start = time.perf_counter()
+        self.chunks.put(item)
+        self.waiting += time.perf_counter() - start
+
+class _Pipeline(object):
+    """
+    Overlaps reading, processing and writing a file. The reader and writer stages run on their own threads and
+    the processing stage runs on the calling thread. The stages are connected by bounded queues sized from the
+    memory budget, so a slow stage holds the others back instead of filling memory.
+    """
+
+    #Largest raw block the reader stage reads at once
+    BLOCK_SIZE = 1048576
+
+    def __init__(self, inHandle, outHandle, encoding, dialect, memoryBudget):
+        """Starts the reader and writer stages
+
+        Parameters
+        ----------
+        inHandle : file
+            The binary file being read, already at the offset to start from
+        outHandle : file
+            The binary file being written, already at the offset to start from
+        encoding : str
+            The file encoding
+        dialect
+            The dialect to write with
+        memoryBudget : int
+            Roughly how many bytes the queues between the stages can hold. Half goes to each queue
+        """
+        blockSize = max(4096, min(_Pipeline.BLOCK_SIZE, memoryBudget // 4))
+        blocks = queue.Queue(max(1, memoryBudget // 2 // blockSize))
+        chunks = queue.Queue(max(1, memoryBudget // 2 // _EncodedWriter.BUFFER_SIZE))
+
+        self.reader = _BlockReader(inHandle, blocks, blockSize)
+        self.writer = _BlockWriter(outHandle, chunks)
+        self.lines = _BlockLineSource(blocks, encoding, inHandle.tell())
+        self.output = _QueuedWriter(outHandle, encoding, dialect, chunks, self.writer)
+
+        self.started = time.perf_counter()
+        self.reader.start()
+        self.writer.start()
+
+    def finish(self):
+        """Stops the reader, waits for the writer to write everything queued, and returns how long each stage
+        was busy along with the total time"""
+        self.reader.stop()
+        self.writer.chunks.put(None)
+        self.reader.join()
+        self.writer.join()
+
+        wall = time.perf_counter() - self.started
+        return {
+            'read': self.reader.busy,
+            'process': wall - self.lines.waiting - self.output.waiting,
+            'write': self.writer.busy,
+            'wall': wall
+        }
+
+class CSVAdjuster(object):
+    """
+    Runs the adjusts from the configuration against every file in each csvs section's read directory,
+    writing the results to the write directory.
+    """
+
+    def __init__(self, adjustConfig):
+        """Creates the adjuster
+
+        Parameters
+        ----------
+        adjustConfig : CSVAdjustConfig
+            The loaded configuration for the run
+        """
+        self.config = adjustConfig.get_config_dict()
+        self.counters = CSVAdjuster._new_counters()
+        self.stageTimes = {'read': 0.0, 'process': 0.0, 'write': 0.0, 'wall': 0.0}
+
+    def run(self):
+        """Adjusts every csvs section in the configuration. Checkpoints are only removed once the whole run has
+        finished, so resuming a run does not redo sections that were already completed."""
+        sections = ConfigSection.CSVS.get_value(self.config)
+        rejectPaths = CSVAdjuster._get_reject_paths(sections)
+
+        checkpoints = []
+        for sectionIndex, section in enumerate(sections):
+            checkpoint = self._adjust_section(sectionIndex, section, rejectPaths[sectionIndex])
+
+            if checkpoint is not None:
+                checkpoints.append(checkpoint)
+
+        for checkpoint in checkpoints:
+            checkpoint.remove()
+
+        logging.info("Finished run. %s", ', '.join('%s: %d' % (k, v) for k, v in self.counters.items()))
+
+    @staticmethod
+    def _get_reject_paths(sections):
+        """Returns the reject file path of each section, or None for sections without one. Each section truncates
+        its reject file when it starts, so a section naming a file an earlier section already uses gets the
+        section's position added to the name"""
+        rejectPaths = []
+        claimed = set()
+        for sectionIndex, section in enumerate(sections):
+            rejectFile = ConfigSection.REJECT_FILE.get_value(section)
+            if rejectFile is None:
+                rejectPaths.append(None)
+                continue
+
+            rejectPath = os.path.join(ConfigSection.WRITE_DIRECTORY.get_value(section), rejectFile)
+            if os.path.normcase(os.path.abspath(rejectPath)) in claimed:
+                root, extension = os.path.splitext(rejectPath)
+                sharedPath = rejectPath
+                rejectPath = "{}.{}{}".format(root, sectionIndex, extension)
+                logging.warning("The reject file %s is already used by an earlier section, section %d writes its "
+                                "rejects to %s instead", sharedPath, sectionIndex, rejectPath)
+
+            claimed.add(os.path.normcase(os.path.abspath(rejectPath)))
+            rejectPaths.append(rejectPath)
+
+        return rejectPaths
+
+    def _adjust_section(self, sectionIndex, section, rejectPath):
+        """Adjusts all the files in a single csvs section. Returns the section's checkpoint if checkpointing is on"""
+        readDirectory = ConfigSection.READ_DIRECTORY.get_value(section)
+        writeDirectory = ConfigSection.WRITE_DIRECTORY.get_value(section)
+        interval = ConfigSection.CHECKPOINT_INTERVAL.get_value(section)
+        plan = AdjustPlan(section)
+
+        # Files are split into lines as bytes so the checkpoint offsets are exact, which needs newlines and
+        # delimiters to be single ASCII bytes
+        if not plan.asciiCompatible:
+            logging.error("The '%s' encoding can't be used for files in %s. Only encodings that write ASCII "
+                          "characters as single ASCII bytes, like utf-8 or latin-1, are supported",
+                          plan.encoding, readDirectory)
+            raise Exception("File encoding is not ASCII compatible")
+
+        if not os.path.exists(writeDirectory):
+            os.makedirs(writeDirectory)
+
+        checkpoint = None
+        if interval > 0:
+            checkpoint = Checkpoint.load(writeDirectory, sectionIndex)
+
+        # Checkpoints are found by the section's position, so one left by a different section after the csvs
+        # list was changed is not used
+        if checkpoint is not None and checkpoint.readDirectory != os.path.abspath(readDirectory):
+            logging.warning("Ignoring checkpoint %s, it was saved for the read directory %s", checkpoint.path,
+                            checkpoint.readDirectory)
+            checkpoint = None
+
+        resuming = checkpoint is not None
+        if resuming:
+            logging.info("Resuming from checkpoint %s", checkpoint.path)
+        elif interval > 0:
+            checkpoint = Checkpoint(writeDirectory, sectionIndex)
+            checkpoint.readDirectory = os.path.abspath(readDirectory)
+
+        if not resuming and ConfigSection.REMOVE_FILES_IN_WRITE_DIRECTORY.get_value(section):
+            for fileName in os.listdir(writeDirectory):
+                if os.path.isfile(os.path.join(writeDirectory, fileName)):
+                    os.remove(os.path.join(writeDirectory, fileName))
+
+        fileNames = [fileName for fileName in sorted(os.listdir(readDirectory))
+                     if os.path.isfile(os.path.join(readDirectory, fileName))]
+
+        #An auto dialect is sniffed from the first file and used for the whole directory
+        if fileNames:
+            plan.get_dialect(CSVAdjuster._read_sample(os.path.join(readDirectory, fileNames[0]), plan.encoding))
+
+        sectionCounters = CSVAdjuster._new_counters()
+        if resuming:
+            sectionCounters.update(checkpoint.counters)
+
+        rejects = None
+        if rejectPath is not None:
+            if resuming and os.path.isfile(rejectPath):
+                rejectHandle = open(rejectPath, 'r+b')
+                rejectHandle.truncate(checkpoint.rejectOffset)
+                rejectHandle.seek(checkpoint.rejectOffset)
+            else:
+                rejectHandle = open(rejectPath, 'wb')
+
+            rejects = _EncodedWriter(rejectHandle, plan.encoding, plan.get_dialect())
+
+        try:
+            for fileName in fileNames:
+                if checkpoint is not None and fileName in checkpoint.completedFiles:
+                    logging.info("Skipping %s, it was completed by an earlier run", fileName)
+                    continue
+
+                self._adjust_file(section, fileName, plan, sectionCounters, checkpoint, rejects)
+        finally:
+            if rejects is not None:
+                rejects.flush()
+                rejects.handle.close()
+
+        for key, value in sectionCounters.items():
+            self.counters[key] += value
+
+        for cached in plan.get_cached_conditionals():
+            logging.info("Cache for column %d: %d hits, %d misses%s", cached.columnNumber, cached.hits,
+                         cached.misses, "" if cached.enabled else " (turned off)")
+
+        return checkpoint
+
+    def _adjust_file(self, section, fileName, plan, counters, checkpoint, rejects):
+        """Adjusts a single file, resuming from the checkpoint if it stopped part way through this file"""
+        readPath = os.path.join(ConfigSection.READ_DIRECTORY.get_value(section), fileName)
+        writePath = os.path.join(ConfigSection.WRITE_DIRECTORY.get_value(section), fileName)
+        interval = ConfigSection.CHECKPOINT_INTERVAL.get_value(section)
+        pipelined = ConfigSection.PIPELINE.get_value(section)
+
+        resuming = checkpoint is not None and checkpoint.fileName == fileName and os.path.isfile(writePath)
+
+        logging.info("%s %s", "Resuming" if resuming else "Adjusting", readPath)
+
+        with open(readPath, 'rb') as inHandle, open(writePath, 'r+b' if resuming else 'wb') as outHandle:
+            if resuming:
+                inHandle.seek(checkpoint.inputOffset)
+                outHandle.truncate(checkpoint.outputOffset)
+                outHandle.seek(checkpoint.outputOffset)
+
+            # Check the start of the file for quoting, then go back so the line offsets stay right
+            start = inHandle.tell()
+            sample = inHandle.read(reader.SAMPLE_SIZE).decode(plan.encoding, errors='ignore')
+            inHandle.seek(start)
+
+            if pipelined:
+                pipeline = _Pipeline(inHandle, outHandle, plan.encoding, plan.get_dialect(),
+                                     ConfigSection.MEMORY_BUDGET.get_value(section))
+                lines = pipeline.lines
+                output = pipeline.output
+            else:
+                lines = _LineSource(inHandle, plan.encoding)
+                output = _EncodedWriter(outHandle, plan.encoding, plan.get_dialect())
+
+            recordNumber = checkpoint.recordNumber if resuming else 0
+
+            try:
+                self._adjust_rows(fileName, plan, sample, lines, output, counters, checkpoint, rejects, interval,
+                                  recordNumber)
+                output.flush()
+            finally:
+                if pipelined:
+                    self._report_stages(fileName, pipeline.finish())
+
+            if pipelined and pipeline.writer.error is not None:
+                raise pipeline.writer.error
+
+            # The whole file has to be on the disk before the checkpoint can say it is done
+            if checkpoint is not None:
+                outHandle.flush()
+                os.fsync(outHandle.fileno())
+
+        counters['filescompleted'] += 1
+
+        if checkpoint is not None:
+            checkpoint.completedFiles.append(fileName)
+            self._save_checkpoint(checkpoint, None, 0, 0, None, rejects, counters)
+
+    def _adjust_rows(self, fileName, plan, sample, lines, output, counters, checkpoint, rejects, interval,
+                     recordNumber):
+        """Runs the plan against every row in the lines, writing to the output and rejects. recordNumber is the
+        number of records in the file before the first line"""
+        sinceCheckpoint = 0
+
+        for row in plan.read_rows(sample, lines):
+            recordNumber += 1
+            counters['rowsread'] += 1
+            original = list(row) if rejects is not None else None
+
+            try:
+                # A blank line has no columns for the conditionals to check, so it is written back as it was
+                changed = plan.adjust_row(row) if row else False
+            except Exception as e:
+                # Without a reject file, a bad row stops the run like it always has
+                if rejects is None:
+                    raise
+
+                logging.warning("Rejected record %d of %s: %s", recordNumber, fileName, e)
+                rejects.writerow([fileName, recordNumber, str(e) or type(e).__name__] + original)
+                counters['rowsrejected'] += 1
+            else:
+                output.writerow(row)
+                counters['rowswritten'] += 1
+                if changed:
+                    counters['rowsadjusted'] += 1
+
+            sinceCheckpoint += 1
+            if checkpoint is not None and sinceCheckpoint >= interval:
+                self._save_checkpoint(checkpoint, fileName, lines.offset, recordNumber, output, rejects, counters)
+                sinceCheckpoint = 0
+
+    def _save_checkpoint(self, checkpoint, fileName, inputOffset, recordNumber, output, rejects, counters):
+        """Flushes the output and reject files to the disk and then records where everything is at. Otherwise a
+        power cut could leave the checkpoint pointing past data that was never written. In a pipeline, the
+        checkpoint is saved by the writer stage once the output up to this point is in the file"""
+        outputOffset = output.flush() if output is not None else 0
+        rejectOffset = 0
+        if rejects is not None:
+            rejectOffset = rejects.flush()
+            rejects.sync()
+        counters = dict(counters)
+
+        def save():
+            if output is not None:
+                output.sync()
+
+            checkpoint.fileName = fileName
+            checkpoint.inputOffset = inputOffset
+            checkpoint.recordNumber = recordNumber
+            checkpoint.outputOffset = outputOffset
+            checkpoint.rejectOffset = rejectOffset
+            checkpoint.counters = counters
+            checkpoint.save()
+
+        if output is not None:
+            output.when_written(save)
+        else:
+            save()
+
+    def _report_stages(self, fileName, stageTimes):
+        """Adds a pipeline's stage times to the run's, and logs how busy each stage was"""
+        for key, value in stageTimes.items():
+            self.stageTimes[key] += value
+
+        wall = stageTimes['wall'] or 1.0
+        logging.info("Stage utilization for %s: read %.0f%%, process %.0f%%, write %.0f%%", fileName,
+                     100 * stageTimes['read'] / wall, 100 * stageTimes['process'] / wall,
+                     100 * stageTimes['write'] / wall)
+
+    def get_stage_utilization(self):
+        """Returns the fraction of the time each pipeline stage was busy over the whole run. The stage that is
+        closest to 1 is the bottleneck"""
+        wall = self.stageTimes['wall']
+        if not wall:
+            return dict()
+
+        return {stage: self.stageTimes[stage] / wall for stage in ('read', 'process', 'write')}
+
+    @staticmethod
+    def _read_sample(path, encoding):
+        """Returns the start of a file as text"""
+        with open(path, 'rb') as file_handle:
+            return file_handle.read(reader.SAMPLE_SIZE).decode(encoding, errors='ignore')
+
+    @staticmethod
+    def _new_counters():
+        """Returns a fresh set of instrumentation counters"""
+        return {
+            'filescompleted': 0,
+            'rowsread': 0,
+            'rowswritten': 0,
+            'rowsadjusted': 0,
+            'rowsrejected': 0
+        }
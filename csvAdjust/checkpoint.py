@@ -0,0 +1,88 @@
+import json, os, logging
+
+class Checkpoint(object):
+    """
+    Records how far a run has made it through one csvs section so that an interrupted
+    run can pick up where it stopped instead of starting over.
+    """
+
+    #Name of the checkpoint file that is kept in the write directory. Sections can share a write directory,
+    #so the file name has the section's position in the csvs list
+    FILE_NAME = 'csvAdjust.{}.checkpoint'
+
+    def __init__(self, directory, sectionIndex):
+        """Creates an empty checkpoint
+
+        Parameters
+        ----------
+        directory : str
+            The write directory of the section. The checkpoint file lives here
+        sectionIndex : int
+            The section's position in the csvs list
+        """
+        self.path = os.path.join(directory, Checkpoint.FILE_NAME.format(sectionIndex))
+        self.readDirectory = None
+        self.completedFiles = []
+        self.fileName = None
+        self.inputOffset = 0
+        self.recordNumber = 0
+        self.outputOffset = 0
+        self.rejectOffset = 0
+        self.counters = dict()
+
+    @classmethod
+    def load(cls, directory, sectionIndex):
+        """Loads the section's checkpoint stored in the directory. Returns None if there isn't one
+
+        Parameters
+        ----------
+        directory : str
+            The write directory of the section
+        sectionIndex : int
+            The section's position in the csvs list
+        """
+        checkpoint = cls(directory, sectionIndex)
+
+        if not os.path.isfile(checkpoint.path):
+            return None
+
+        with open(checkpoint.path, 'r') as file_handle:
+            state = json.load(file_handle)
+
+        checkpoint.readDirectory = state.get('readdirectory')
+        checkpoint.completedFiles = state['completedfiles']
+        checkpoint.fileName = state['filename']
+        checkpoint.inputOffset = state['inputoffset']
+        checkpoint.recordNumber = state['recordnumber']
+        checkpoint.outputOffset = state['outputoffset']
+        checkpoint.rejectOffset = state['rejectoffset']
+        checkpoint.counters = state['counters']
+
+        return checkpoint
+
+    def save(self):
+        """Writes the checkpoint to disk. The file is written to the side and then moved into place, so a crash
+        in the middle of saving leaves the previous checkpoint intact"""
+        state = {
+            'readdirectory': self.readDirectory,
+            'completedfiles': self.completedFiles,
+            'filename': self.fileName,
+            'inputoffset': self.inputOffset,
+            'recordnumber': self.recordNumber,
+            'outputoffset': self.outputOffset,
+            'rejectoffset': self.rejectOffset,
+            'counters': self.counters
+        }
+
+        tempPath = self.path + '.tmp'
+        with open(tempPath, 'w') as file_handle:
+            json.dump(state, file_handle)
+            file_handle.flush()
+            os.fsync(file_handle.fileno())
+
+        os.replace(tempPath, self.path)
+
+    def remove(self):
+        """Removes the checkpoint file once it is no longer needed"""
+        if os.path.isfile(self.path):
+            os.remove(self.path)
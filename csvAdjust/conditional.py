@@ -19,9 +19,37 @@ class Conditional(ABC):
     def get_required_fields(cls):
         """This method will return the fields required by the conditional"""
         
+    def evaluate(self, row, results):
+        """Checks the conditional at most once per row, however many adjusts share it
+        
+        Parameters
+        ----------
+        row : list
+            The values of an entire row in a CSV. Each element is a different column
+        results : dict
+            The results of the conditionals already checked against this row
+        """
+        try:
+            return results[self]
+        except KeyError:
+            met = results[self] = self.is_met(row)
+            return met
+    
     @staticmethod
-    def parse_conditionals(conditional_list):
-        """Takes a list of dictionaries that contain conditional configurations and transforms them into conditional objects"""
+    def parse_conditionals(conditional_list, registry=None):
+        """Takes a list of dictionaries that contain conditional configurations and transforms them into conditional objects
+        
+        Parameters
+        ----------
+        conditional_list : list
+            The conditional configurations. and, or and not groups contain their own conditionals list
+        registry : dict
+            Optional. Conditionals already created, keyed by their configuration. Identical conditionals are
+            only created once, so passing the same registry for every adjust lets them share results
+        """
+        if registry is None:
+            registry = dict()
+            
         conditionals = []
         for condition in conditional_list:
             conType = ConditionalType.get_type(condition['type'])
@@ -29,7 +57,7 @@ class Conditional(ABC):
             # If we can't figure out the type, throw an exception to prevent unintended wonky stuff from happening in the output files
             if conType is None:
                 logging.error("Unable to determine conditional type '%s'. Available conditional types are '%s'", 
-                              condition['type'], ', '.join(str(e.jsonName) for e in conTypes))
+                              condition['type'], ', '.join(str(e.jsonName) for e in ConditionalType))
                 
                 raise Exception("Unable to determine conditional type")
             
@@ -45,12 +73,43 @@ class Conditional(ABC):
                                   field.jsonName, conType.name)
                     raise Exception("Missing required field for conditional")
                 
-                fieldValues.append(condition[field.jsonName])
+                # Groups hold conditionals of their own
+                if field is CSVAdjustFieldType.CONDITIONALS:
+                    fieldValues.append(Conditional.parse_conditionals(condition[field.jsonName], registry))
+                else:
+                    fieldValues.append(condition[field.jsonName])
                 
+            # Children have already been shared, so a group is identified by the children it has
+            key = (conType, condition.get(CSVAdjustFieldType.CACHE_SIZE.jsonName)) + tuple(
+                tuple(id(child) for child in value) if type(value) is list else (type(value), value)
+                for value in fieldValues)
+            
+            if key in registry:
+                conditionals.append(registry[key])
+                continue
+            
             # Now lets actually create the conditional objects. 
             # We can pass in the values stored in the fieldValues list as arguments to the constructor by unpacking the list
             # We do that by putting a * in front of the variable name
-            conditionals.append(conType.implementation(*fieldValues))  
+            conditional = conType.implementation(*fieldValues)
+            
+            # Optionally remember the results for each value of the column
+            if CSVAdjustFieldType.CACHE_SIZE.jsonName in condition:
+                if not hasattr(conditional, 'columnNumber'):
+                    logging.error("A '%s' condition does not check a single column, so its results can't be cached",
+                                  conType.name)
+                    raise Exception("Cache is not supported for conditional")
+                
+                cacheSize = condition[CSVAdjustFieldType.CACHE_SIZE.jsonName]
+                if type(cacheSize) is not int or cacheSize < 1:
+                    logging.error("The cache size '%s' of a '%s' condition has to be a whole number above 0",
+                                  cacheSize, conType.name)
+                    raise Exception("Invalid cache size for conditional")
+                
+                conditional = CachedConditional(conditional, cacheSize)
+                
+            registry[key] = conditional
+            conditionals.append(conditional)
             
         return conditionals
                 
@@ -146,12 +205,160 @@ class RowContains(Conditional):
     def get_required_fields(cls):
         return (CSVAdjustFieldType.VALUE,)
     
+class CachedConditional(Conditional):
+    """Remembers the results of a column conditional by the value in the column, so columns with only a few
+    distinct values don't get checked again for every row. If the column turns out to have too many distinct
+    values for the cache to help, the cache turns itself off.
+    
+    A hit is a single dictionary lookup with no lock, because single dictionary operations are already thread
+    safe. The counters aren't locked either, so with several threads they are close but not exact."""
+    
+    #Number of lookups before the hit rate is checked
+    SAMPLE_SIZE = 10000
+    
+    #The cache turns off if the hit rate is below this once the sample size is reached
+    MIN_HIT_RATE = 0.5
+    
+    def __init__(self, conditional, size):
+        """Creates a cache in front of a conditional
+        
+        Parameters
+        ----------
+        conditional : Conditional
+            The conditional being cached. It has to check a single column
+        size : int
+            The most values to remember. When the cache is full, the oldest value is forgotten first
+        """
+        self.conditional = conditional
+        self.columnNumber = conditional.columnNumber
+        self.size = size
+        self.cache = dict()
+        self.hits = 0
+        self.misses = 0
+        self.enabled = True
+        
+    def is_met(self, row):
+        """"Looks up the column's value in the cache, only checking the conditional when it isn't there
+        
+        Parameters
+        ----------
+        row : list
+            The values of an entire row in a CSV. Each element is a different column
+        """
+        value = row[self.columnNumber]
+        result = self.cache.get(value)
+        if result is not None:
+            self.hits += 1
+            return result
+        
+        return self._miss(row, value)
+    
+    def _miss(self, row, value):
+        """Checks the conditional and remembers the result. All the bookkeeping happens here, off the hit path"""
+        result = self.conditional.is_met(row)
+        if not self.enabled:
+            return result
+        
+        self.misses += 1
+        cache = self.cache
+        if len(cache) >= self.size:
+            try:
+                del cache[next(iter(cache))]
+            except (RuntimeError, StopIteration, KeyError):
+                # Another thread changed the cache at the same time, so it just doesn't get trimmed this time
+                pass
+            
+        cache[value] = result
+        
+        lookups = self.hits + self.misses
+        if lookups >= CachedConditional.SAMPLE_SIZE and self.hits < lookups * CachedConditional.MIN_HIT_RATE:
+            logging.info("Turning off the cache for column %d, only %d of %d lookups were hits",
+                         self.columnNumber, self.hits, lookups)
+            self.enabled = False
+            cache.clear()
+            
+            # From now on, skip the cache completely
+            self.is_met = self.conditional.is_met
+            
+        return result
+    
+    @classmethod
+    def get_required_fields(cls):
+        return (CSVAdjustFieldType.CACHE_SIZE,)
+    
+class ConditionalGroup(Conditional):
+    """Class that the and, or and not groups inherit. A group combines the results of the conditionals it holds"""
+    
+    def __init__(self, conditionals):
+        """Creates a group
+        
+        Parameters
+        ----------
+        conditionals : list
+            The conditional objects in the group
+        """
+        self.conditionals = tuple(conditionals)
+        
+    def is_met(self, row):
+        return self.combine(row, dict())
+        
+    def evaluate(self, row, results):
+        """Same as Conditional.evaluate, except the results are handed down so the group's conditionals are shared too"""
+        try:
+            return results[self]
+        except KeyError:
+            met = results[self] = self.combine(row, results)
+            return met
+        
+    @abstractmethod
+    def combine(self, row, results):
+        """Child classes implement this to combine the results of their conditionals. Only as many conditionals
+        as it takes to know the answer are checked"""
+        pass
+    
+    @classmethod
+    def get_required_fields(cls):
+        return (CSVAdjustFieldType.CONDITIONALS,)
+    
+class AndGroup(ConditionalGroup):
+    """Met when all of its conditionals are met"""
+    
+    def combine(self, row, results):
+        for conditional in self.conditionals:
+            if not conditional.evaluate(row, results):
+                return False
+            
+        return True
+    
+class OrGroup(ConditionalGroup):
+    """Met when any of its conditionals are met"""
+    
+    def combine(self, row, results):
+        for conditional in self.conditionals:
+            if conditional.evaluate(row, results):
+                return True
+            
+        return False
+    
+class NotGroup(ConditionalGroup):
+    """Met when none of its conditionals are met. With a single conditional, this is a plain not"""
+    
+    def combine(self, row, results):
+        for conditional in self.conditionals:
+            if conditional.evaluate(row, results):
+                return False
+            
+        return True
+    
 class ConditionalType(Enum):
     """The types of conditionals that can be used"""
     
     COLUMN_EQUALS = ("columnequals", ColumnEquals)
     COLUMN_CONTAINS = ("columncontains", ColumnContains)
     ROW_CONTAINS = ("rowcontains", RowContains)
+    AND = ("and", AndGroup)
+    OR = ("or", OrGroup)
+    NOT = ("not", NotGroup)
     
 
     def __init__(self, jsonName, implementation):
@@ -162,7 +369,7 @@ class ConditionalType(Enum):
     def get_type(cls, name):
         """Returns the ConditionalType that matches the string passed in"""
         for conditional in cls:
-            if conditional.jsonName is name:
+            if conditional.jsonName == str(name).lower():
                 return conditional
             
         return None
\ No newline at end of file
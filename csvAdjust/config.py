@@ -47,6 +47,16 @@ class ConfigSection(Enum):
     FILE_ENCODING = ("File Encoding", CSVS[0], "fileencoding", "utf-8")
     REMOVE_FILES_IN_WRITE_DIRECTORY = ("Remove Files In Write Directory", CSVS[0], "removefilesinwritedirectory", False)
     DIALECT = ("Dialect", CSVS[0], "dialect", "excel")
+    CHECKPOINT_INTERVAL = ("Checkpoint Interval", CSVS[0], "checkpointinterval", 0)
+    REJECT_FILE = ("Reject File", CSVS[0], "rejectfile", None)
+    PIPELINE = ("Pipeline", CSVS[0], "pipeline", False)
+    MEMORY_BUDGET = ("Memory Budget", CSVS[0], "memorybudget", 67108864)
+
+    #Adjusts section, which lives inside each CSVs entry
+    ADJUSTS = ("Adjusts", CSVS[0], "adjusts", [])
+    CONDITIONALS = ("Conditionals", ADJUSTS[0], "conditionals", [])
+    CONDITIONALS_BOOLEAN = ("Conditionals Boolean", ADJUSTS[0], "conditionalsboolean", "AND")
+    TRANSFORMERS = ("Transformers", ADJUSTS[0], "transformers", [])
 
     def __init__(self, id, parentSection, jsonName, defaultValue):
         self.id = id
@@ -64,6 +74,10 @@ class ConfigSection(Enum):
 
         return ret_list
 
+    def get_value(self, section_dict):
+        """Returns this section's value from the dictionary passed in, or the default value if it isn't there"""
+        return section_dict.get(self.jsonName, self.defaultValue)
+
 class CSVAdjustConfig(object):
     """
     The basic object for loading and managing the configuartion
@@ -0,0 +1,274 @@
+import csv, io, codecs, logging
+from .config import ConfigSection, CSVAdjustConfig, lower_case_all_keys
+from .conditional import Conditional, CachedConditional, ConditionalGroup, AndGroup, OrGroup
+from .transformer import Transformer
+from . import reader
+
+class Adjust(object):
+    """A single entry from the adjusts list. When the conditionals are met, the transformers are run against the row"""
+
+    def __init__(self, conditionals, conditionalsBoolean, transformers):
+        """Creates an adjust
+
+        Parameters
+        ----------
+        conditionals : list
+            The conditional objects that decide if the row gets changed. These can be groups of their own
+        conditionalsBoolean : str
+            Either AND or OR. Decides how the top level conditionals are combined
+        transformers : list
+            The transformer objects that are run when the conditionals are met
+        """
+        boolean = str(conditionalsBoolean).upper()
+        if boolean == "AND":
+            self.condition = AndGroup(conditionals)
+        elif boolean == "OR":
+            self.condition = OrGroup(conditionals)
+        else:
+            logging.error("Unable to determine conditionals boolean '%s'. Available values are 'AND, OR'",
+                          conditionalsBoolean)
+            raise Exception("Unable to determine conditionals boolean")
+
+        self.conditionals = self.condition.conditionals
+        self.transformers = tuple(transformers)
+
+    @staticmethod
+    def parse_adjusts(adjust_list):
+        """Takes the adjusts list from a csvs section and transforms it into adjust objects. Identical conditionals
+        in different adjusts are created once, so they are only checked once per row"""
+        registry = dict()
+        adjusts = []
+        for config in adjust_list:
+            adjusts.append(Adjust(
+                Conditional.parse_conditionals(ConfigSection.CONDITIONALS.get_value(config), registry),
+                ConfigSection.CONDITIONALS_BOOLEAN.get_value(config),
+                Transformer.parse_transformers(ConfigSection.TRANSFORMERS.get_value(config))
+            ))
+
+        return adjusts
+
+    def is_met(self, row, results=None):
+        """Checks the conditionals against the row
+
+        Parameters
+        ----------
+        row : list
+            The values of an entire row in a CSV
+        results : dict
+            Optional. The results of conditionals already checked against this row
+        """
+        if results is None:
+            results = dict()
+
+        return self.condition.combine(row, results)
+
+    def transform(self, row, results=None):
+        """Runs every transformer against the row if the conditionals are met. Returns True if the row was changed"""
+        if not self.is_met(row, results):
+            return False
+
+        for transformer in self.transformers:
+            transformer.transform(row)
+
+        return True
+
+class AdjustPlan(object):
+    """
+    The adjusts, encoding and dialect of a single csvs section, parsed and validated once so they can be applied
+    to rows that never touch the disk. Apart from remembering a sniffed dialect and filling the conditional caches,
+    a plan is never changed after it is built, so one plan can be shared by any number of threads.
+    """
+
+    #Dialect setting that has the dialect sniffed from the data instead of configured
+    AUTO_DIALECT = "auto"
+
+    #Characters an encoding has to write as plain ASCII for files to be split into lines as bytes
+    _ASCII_SAMPLE = "\r\n\t ,;|:\"'\\azAZ09"
+
+    def __init__(self, section):
+        """Builds the plan. Use AdjustPlan.build unless you already have a lower cased csvs section
+
+        Parameters
+        ----------
+        section : dict
+            A csvs section with lower cased keys
+
+        Raises
+        ------
+
+        Exception
+            If the encoding, dialect or any of the adjusts are not valid
+        """
+        self.adjusts = tuple(Adjust.parse_adjusts(ConfigSection.ADJUSTS.get_value(section)))
+
+        encoding = ConfigSection.FILE_ENCODING.get_value(section)
+        try:
+            self.encoding = codecs.lookup(encoding).name
+        except LookupError:
+            logging.error("Unknown file encoding '%s'", encoding)
+            raise Exception("Unknown file encoding")
+
+        # utf-16 and the like can still be used on data in memory, but not by the file engine
+        self.asciiCompatible = (AdjustPlan._ASCII_SAMPLE.encode(self.encoding) ==
+                                AdjustPlan._ASCII_SAMPLE.encode('ascii'))
+
+        self.dialect = ConfigSection.DIALECT.get_value(section)
+        self._sniffedDialect = None
+        if self.dialect != AdjustPlan.AUTO_DIALECT and self.dialect not in csv.list_dialects():
+            logging.error("Unknown dialect '%s'. Available dialects are '%s'",
+                          self.dialect, ', '.join(csv.list_dialects()))
+            raise Exception("Unknown dialect")
+
+    @classmethod
+    def build(cls, source, sectionIndex=0):
+        """Builds a plan from a configuration
+
+        Parameters
+        ----------
+        source : dict or CSVAdjustConfig
+            Either a loaded configuration, a whole configuration dictionary with a csvs list,
+            or a single csvs section
+        sectionIndex : int
+            Which entry of the csvs list to build the plan from. Ignored for a single section
+        """
+        if isinstance(source, CSVAdjustConfig):
+            source = source.get_config_dict()
+        else:
+            source = lower_case_all_keys(source)
+
+        if ConfigSection.CSVS.jsonName in source:
+            source = source[ConfigSection.CSVS.jsonName][sectionIndex]
+
+        return cls(source)
+
+    def get_dialect(self, sample=None):
+        """Returns the dialect to read and write with. When the dialect is auto, it is sniffed from the first sample
+        passed in and cached, so a plan sniffs once for a whole directory or any number of payloads. Until there is
+        a sample to sniff, excel is used"""
+        if self.dialect != AdjustPlan.AUTO_DIALECT:
+            return self.dialect
+
+        if self._sniffedDialect is None and sample:
+            # Don't let the sniffer see a partial last line. It also mistakes the \r of a \r\n after a closing
+            # quote for the delimiter, so it only gets to see \n line endings
+            if '\n' in sample:
+                sample = sample[:sample.rindex('\n') + 1]
+            sample = sample.replace('\r\n', '\n')
+
+            try:
+                sniffed = csv.Sniffer().sniff(sample)
+            except csv.Error:
+                logging.warning("Unable to sniff the dialect, using excel")
+                sniffed = csv.excel
+
+            # Only the delimiter and quote character are taken from the sample. A sample without quotes leaves the
+            # sniffer with no doubled quotes or escape character, and later rows with quotes in them would then be
+            # misread or fail to write
+            class SniffedDialect(csv.excel):
+                delimiter = sniffed.delimiter
+                quotechar = sniffed.quotechar or csv.excel.quotechar
+
+            self._sniffedDialect = SniffedDialect()
+
+        if self._sniffedDialect is None:
+            return 'excel'
+
+        return self._sniffedDialect
+
+    def read_rows(self, sample, lines):
+        """Returns an iterator of the rows in the lines, picking the fast path when the sample has no quoting
+
+        Parameters
+        ----------
+        sample : str
+            The start of the data, used to sniff the dialect and check for quoting
+        lines : iterable
+            Every line of the data, including the ones in the sample
+        """
+        dialect = self.get_dialect(sample)
+        return reader.read_rows(lines, dialect, reader.is_simple(sample, dialect))
+
+    def get_cached_conditionals(self):
+        """Returns the conditionals in the plan that cache their results, so their hits and misses can be reported"""
+        cached = []
+        seen = set()
+        remaining = [adjust.condition for adjust in self.adjusts]
+        while remaining:
+            conditional = remaining.pop()
+            if conditional in seen:
+                continue
+            seen.add(conditional)
+
+            if isinstance(conditional, CachedConditional):
+                cached.append(conditional)
+            elif isinstance(conditional, ConditionalGroup):
+                remaining.extend(conditional.conditionals)
+
+        return cached
+
+    def adjust_row(self, row):
+        """Runs every adjust against the row, changing it in place. Returns True if any adjust changed it.
+        Conditionals shared between adjusts are checked once, until an adjust changes the row"""
+        changed = False
+        results = dict()
+        for adjust in self.adjusts:
+            if adjust.transform(row, results):
+                changed = True
+                results.clear()
+
+        return changed
+
+    def apply_rows(self, rows, rejected=None):
+        """Returns a generator of the adjusted rows. The rows passed in are copied, not changed
+
+        Parameters
+        ----------
+        rows : iterable
+            The rows to adjust. Each row is a sequence of column values
+        rejected : callable
+            Optional. Called with the original row and the exception when a row fails to transform.
+            The row is then left out of the results. Without it, the exception is raised
+        """
+        adjust_row = self.adjust_row
+        for row in rows:
+            row = list(row)
+
+            # Blank lines have no columns to check, they are passed through as they are
+            if not row:
+                yield row
+                continue
+
+            if rejected is None:
+                adjust_row(row)
+                yield row
+                continue
+
+            original = list(row)
+            try:
+                adjust_row(row)
+            except Exception as e:
+                rejected(original, e)
+                continue
+
+            yield row
+
+    def apply_bytes(self, data, rejected=None):
+        """Returns a generator of the adjusted rows parsed from a bytes buffer using the plan's encoding and dialect"""
+        return self.apply_file(io.StringIO(codecs.decode(data, self.encoding), newline=''), rejected)
+
+    def apply_file(self, fileHandle, rejected=None):
+        """Returns a generator of the adjusted rows read from a file like object. Binary files are decoded with the
+        plan's encoding, text files should be opened with newline=''"""
+        # Plenty of file like objects aren't io classes, so what a read gives back decides if it is text
+        wrapped = not isinstance(fileHandle.read(0), str)
+        if wrapped:
+            # Decoding the whole stream, not line by line, is what makes encodings like utf-16 work
+            fileHandle = io.TextIOWrapper(fileHandle, encoding=self.encoding, newline='')
+
+        try:
+            sample, lines = reader.sample_lines(fileHandle)
+            yield from self.apply_rows(self.read_rows(sample, lines), rejected)
+        finally:
+            # Hand the file back without closing it, it belongs to the caller
+            if wrapped:
+                fileHandle.detach()
@@ -0,0 +1,96 @@
+import csv, itertools
+
+#Number of characters at the start of a file that are checked before deciding how to read it
+SAMPLE_SIZE = 65536
+
+#Quoting settings where the csv reader leaves unquoted fields alone, so splitting gives the same result
+_SPLITTABLE_QUOTING = (csv.QUOTE_MINIMAL, csv.QUOTE_ALL, csv.QUOTE_NONE)
+
+def _get_dialect(dialect):
+    """Returns the dialect object for a dialect name, or the dialect passed in if it already is one"""
+    if isinstance(dialect, str):
+        return csv.get_dialect(dialect)
+
+    return dialect
+
+def _special_characters(dialect):
+    """Returns the characters that make the csv module necessary for a line"""
+    characters = []
+    if dialect.quoting != csv.QUOTE_NONE and dialect.quotechar:
+        characters.append(dialect.quotechar)
+    if dialect.escapechar:
+        characters.append(dialect.escapechar)
+
+    return tuple(characters)
+
+def is_simple(sample, dialect):
+    """Checks if rows can be read by splitting on the delimiter instead of going through the csv module.
+    That is the case when the sample has none of the dialect's quote or escape characters, and the dialect
+    doesn't ask the csv module to do anything else with unquoted fields
+
+    Parameters
+    ----------
+    sample : str
+        The start of the file
+    dialect
+        The dialect name or object the file is read with
+    """
+    dialect = _get_dialect(dialect)
+
+    if dialect.skipinitialspace or dialect.quoting not in _SPLITTABLE_QUOTING:
+        return False
+
+    for character in _special_characters(dialect):
+        if character in sample:
+            return False
+
+    return True
+
+def sample_lines(lines, size=SAMPLE_SIZE):
+    """Reads lines until there are at least size characters to check. Returns the sample and an iterator that
+    still gives every line, including the ones read for the sample"""
+    lines = iter(lines)
+    head = []
+    total = 0
+    for line in lines:
+        head.append(line)
+        total += len(line)
+        if total >= size:
+            break
+
+    return ''.join(head), itertools.chain(head, lines)
+
+def read_rows(lines, dialect, simple):
+    """Returns an iterator of the rows in the lines
+
+    Parameters
+    ----------
+    lines : iterable
+        The decoded lines of the file, with their line endings. Splitting them on the delimiter is only as
+        correct as the lines are. The file engine cuts lines on raw newline bytes before decoding them, so it
+        only handles ASCII compatible encodings, while AdjustPlan.apply_file decodes the whole stream first
+    dialect
+        The dialect name or object the file is read with
+    simple : bool
+        The result of is_simple for the file. When True, lines are split on the delimiter until one of them
+        has a quote or escape character, and from then on the csv module reads the rest
+    """
+    if not simple:
+        return csv.reader(lines, dialect=dialect)
+
+    return _split_rows(iter(lines), _get_dialect(dialect))
+
+def _split_rows(lines, dialect):
+    """Generator behind the fast path of read_rows"""
+    delimiter = dialect.delimiter
+    special = _special_characters(dialect)
+
+    for line in lines:
+        for character in special:
+            if character in line:
+                # A quoted field can run over several lines, so the csv module takes over for the rest of the file
+                yield from csv.reader(itertools.chain((line,), lines), dialect=dialect)
+                return
+
+        line = line.rstrip('\r\n')
+        yield line.split(delimiter) if line else []
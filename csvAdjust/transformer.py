@@ -1,18 +1,14 @@
-import logging
+import logging, re, math
+from decimal import Decimal, Context, localcontext, MAX_PREC, MAX_EMAX, MIN_EMIN
 from enum import Enum
 from abc import ABC, abstractmethod
 from . import CSVAdjustFieldType
 
-class OperationType(Enum):
-    """Operation types supported"""
-    REPLACE = ("replace")
-    ADD = ("add")
-    SUBTRACT = ("subtract")
-    APPEND = ("append")
-    
-    def __init__(self, jsonName):
-        self.jsonName = jsonName
-        
+class TransformError(Exception):
+    """Raised when a transformer is unable to change a row. The message is the reason, and it is what ends up
+    in the reject file when one is configured"""
+    pass
+
 class Transformer(ABC):
     """Abstract class that concrete transformer classes extend."""
     
@@ -25,10 +21,50 @@ class Transformer(ABC):
     @abstractmethod
     def get_required_fields(cls):
         """This method will return the fields required to instantiate the transformer"""
+        
+    @staticmethod
+    def parse_transformers(transformer_list):
+        """Takes a list of dictionaries that contain transformer configurations and transforms them into transformer objects"""
+        transformers = []
+        for config in transformer_list:
+            opType = OperationType.get_type(config['operation'])
+            
+            # Same as the conditionals, an unknown operation is a hard stop
+            if opType is None:
+                logging.error("Unable to determine operation '%s'. Available operations are '%s'",
+                              config['operation'], ', '.join(str(e.jsonName) for e in OperationType))
+                
+                raise Exception("Unable to determine transformer operation")
+            
+            fieldValues = []
+            for field in opType.implementation.get_required_fields():
+                if field.jsonName not in config:
+                    logging.error("Unable to find required field '%s' for a '%s' operation",
+                                  field.jsonName, opType.name)
+                    raise Exception("Missing required field for transformer")
+                
+                fieldValues.append(config[field.jsonName])
+            
+            # Arithmetic on a text value would only fail once the rows are being read
+            if issubclass(opType.implementation, NumberTransformer):
+                value = config[CSVAdjustFieldType.VALUE.jsonName]
+                if (type(value) is not int and type(value) is not float) or not math.isfinite(value):
+                    logging.error("The value '%s' of a '%s' operation has to be a number", value, opType.name)
+                    raise Exception("Transformer value is not a number")
+                
+            transformers.append(opType.implementation(*fieldValues))
+            
+        return transformers
 
 class NumberTransformer(Transformer, ABC):
     """Class that all arithmetic transformations inherit."""
     
+    #Numbers as they are written in a CSV. Python would also take things like 1_000, nan and inf, which are left alone
+    _NUMBER_PATTERN = re.compile(r'[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?')
+    
+    #Text cells are worked out with enough precision that the result is exact
+    _CONTEXT = Context(prec=MAX_PREC, Emax=MAX_EMAX, Emin=MIN_EMIN)
+    
     def __init__(self, columnNumber, value):
         """Creates a number transformer object
         
@@ -41,11 +77,54 @@ class NumberTransformer(Transformer, ABC):
         """
         self.columnNumber = columnNumber
         self.value = value
+        self._decimalValue = Decimal(str(value)) if type(value) is int or type(value) is float else None
         
     def transform(self, row):
-        if not type(row[self.columnNumber]) is int:# or not type(row[self.columnNumber]) is float:
-            logging.error("Unable to add '%d' to '%s'", self.value, row[self.columnNumber])
-            raise Exception("Cannot add value to non number types")
+        """Reads the cell as a number, calculates the new value and puts it back in the cell. Cells read from a CSV
+        are text, so text cells are worked out as decimals and the result goes back in as text, keeping the
+        cell's decimal places and any zeros it is padded with
+        
+        Raises
+        ------
+        
+        TransformError
+            If the cell's value is not a number
+        """
+        cell = row[self.columnNumber]
+        
+        if type(cell) is int or type(cell) is float:
+            row[self.columnNumber] = self.calculate(cell, self.value)
+            return
+        
+        match = NumberTransformer._NUMBER_PATTERN.fullmatch(cell) if isinstance(cell, str) else None
+        if match is None or self._decimalValue is None:
+            logging.error("Unable to %s '%s' and '%s'", type(self).__name__.lower(), cell, self.value)
+            raise TransformError("Cannot do arithmetic on non number types")
+        
+        with localcontext(NumberTransformer._CONTEXT):
+            result = self.calculate(Decimal(cell), self._decimalValue)
+        
+        # Numbers with an exponent are written back the way Decimal writes them
+        if match.group(2):
+            row[self.columnNumber] = str(result)
+            return
+        
+        text = format(result, 'f')
+        
+        # A cell padded with zeros, like 007, keeps its width
+        digits = match.group(1).split('.')[0]
+        if len(digits) > 1 and digits.startswith('0'):
+            sign, text = ('-', text[1:]) if text.startswith('-') else ('', text)
+            whole, point, fraction = text.partition('.')
+            text = sign + whole.zfill(len(digits)) + point + fraction
+        
+        row[self.columnNumber] = text
+        
+    @abstractmethod
+    def calculate(self, number, value):
+        """Child classes implement this to return the new value for the cell. The value is the configured value,
+        as a Decimal when the cell is text"""
+        pass
         
     @classmethod
     def get_required_fields(cls):
@@ -89,30 +168,34 @@ class Add(NumberTransformer):
     """Adds the requested value to the value of the cell. This will raise an exception if the cell
     is not a number type"""
         
-    def transform(self, row):
-        """Adds the value in the cell specified with the value requested
-        
-        Raises
-        ------
-        
-        Exception
-            If the cell's value does not contain a number
-        """
-        super().transform(row)
-        row[self.columnNumber] = row[self.columnNumber] + self.value
+    def calculate(self, number, value):
+        """Adds the value requested to the number in the cell"""
+        return number + value
     
 class Subtract(NumberTransformer):
     """Subtracts the requested value to the value of the cell. This will raise an exception if the cell
     is not a number type"""
         
-    def transform(self, row):
-        """Subtracts the value in the cell specified with the value requested
+    def calculate(self, number, value):
+        """Subtracts the value requested from the number in the cell"""
+        return number - value
         
-        Raises
-        ------
+class OperationType(Enum):
+    """Operation types supported"""
+    REPLACE = ("replace", Replace)
+    ADD = ("add", Add)
+    SUBTRACT = ("subtract", Subtract)
+    APPEND = ("append", Append)
+    
+    def __init__(self, jsonName, implementation):
+        self.jsonName = jsonName
+        self.implementation = implementation
         
-        Exception
-            If the cell's value does not contain a number
-        """
-        super().transform(row)
-        row[self.columnNumber] = row[self.columnNumber] - self.value
\ No newline at end of file
+    @classmethod
+    def get_type(cls, name):
+        """Returns the OperationType that matches the string passed in"""
+        for operation in cls:
+            if operation.jsonName == str(name).lower():
+                return operation
+            
+        return None
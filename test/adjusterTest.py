@@ -0,0 +1,371 @@
+import unittest, os, json, shutil
+from unittest import mock
+
+from csvAdjust import config, adjuster, plan
+from csvAdjust.checkpoint import Checkpoint
+
+class CSVAdjusterTest(unittest.TestCase):
+    """Tests for the CSVAdjuster engine"""
+
+    __TEMP_PATH = None
+
+    def test_adjust_files(self):
+        """Verifies rows that meet the conditionals are transformed and the rest are copied"""
+        self.write_input("colors.csv", CSVAdjusterTest.get_default_rows())
+
+        run = adjuster.CSVAdjuster(self.load_config())
+        run.run()
+
+        rows = self.read_output("colors.csv")
+
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[0], ["1", "Red", "Apple"])
+        self.assertEqual(rows[1], ["2", "Blue", "Blueberry!"])
+        self.assertEqual(rows[4], ["5", "Blue", "Sky!"])
+        self.assertEqual(run.counters['rowsadjusted'], 2)
+
+        #The checkpoint is removed once the run is done
+        self.assertFalse(os.path.exists(os.path.join(self.writePath, Checkpoint.FILE_NAME.format(0))))
+
+    def test_quoted_and_sniffed_files(self):
+        """Verifies quoting part way through a file is read correctly and an auto dialect is sniffed"""
+        rows = CSVAdjusterTest.get_default_rows()
+        rows[3] = ["4", "Blue", "\"Banana;split\""]
+        self.write_input("colors.csv", rows, delimiter=';')
+
+        section = CSVAdjusterTest.get_section(self.readPath, self.writePath)
+        section['dialect'] = 'auto'
+
+        adjuster.CSVAdjuster(self.load_config(section)).run()
+
+        with open(os.path.join(self.writePath, "colors.csv"), 'r', newline='') as fileHandle:
+            output = fileHandle.read().split('\r\n')
+
+        self.assertEqual(output[1], "2;Blue;Blueberry!")
+        self.assertEqual(output[3], "4;Blue;\"Banana;split!\"")
+
+    def test_sniffed_file_without_quotes(self):
+        """Verifies quotes in later files are handled when the file the dialect was sniffed from has none"""
+        self.write_input("a.csv", CSVAdjusterTest.get_default_rows(), delimiter=';')
+        with open(os.path.join(self.readPath, "b.csv"), 'w', newline='') as fileHandle:
+            fileHandle.write('1;Blue;"a""b"\r\n2;Red;5" screen\r\n')
+
+        section = CSVAdjusterTest.get_section(self.readPath, self.writePath)
+        section['dialect'] = 'auto'
+
+        adjuster.CSVAdjuster(self.load_config(section)).run()
+
+        with open(os.path.join(self.writePath, "b.csv"), 'r', newline='') as fileHandle:
+            self.assertEqual(fileHandle.read(), '1;Blue;"a""b!"\r\n2;Red;"5"" screen"\r\n')
+
+    def test_blank_lines(self):
+        """Verifies blank lines are copied to the output instead of being checked against the conditionals"""
+        for quoted in [False, True]:
+            data = "1,Blue,Sky\r\n\r\n2,Red,%s\r\n\r\n" % ("\"Apple\"" if quoted else "Apple")
+            with open(os.path.join(self.readPath, "colors.csv"), 'w', newline='') as fileHandle:
+                fileHandle.write(data)
+
+            run = adjuster.CSVAdjuster(self.load_config())
+            run.run()
+
+            with open(os.path.join(self.writePath, "colors.csv"), 'r', newline='') as fileHandle:
+                self.assertEqual(fileHandle.read(), "1,Blue,Sky!\r\n\r\n2,Red,Apple\r\n\r\n")
+            self.assertEqual(run.counters['rowswritten'], 4)
+
+    def test_add_to_numeric_column(self):
+        """Verifies arithmetic works on the numbers in a file, which are read as text"""
+        self.write_input("colors.csv", CSVAdjusterTest.get_default_rows())
+
+        section = CSVAdjusterTest.get_section(self.readPath, self.writePath)
+        section['rejectFile'] = 'rejects.csv'
+        section['adjusts'][0]['transformers'] = [{"operation": "add", "columnNumber": 0, "value": 10}]
+
+        run = adjuster.CSVAdjuster(self.load_config(section))
+        run.run()
+
+        rows = self.read_output("colors.csv")
+        self.assertEqual(rows[0], ["1", "Red", "Apple"])
+        self.assertEqual(rows[1], ["12", "Blue", "Blueberry"])
+        self.assertEqual(rows[4], ["15", "Blue", "Sky"])
+        self.assertEqual(run.counters['rowsrejected'], 0)
+        self.assertEqual(self.read_output("rejects.csv"), [])
+
+    def test_unsupported_encoding(self):
+        """Verifies encodings that can't be split into lines as bytes are refused before any file is touched"""
+        self.write_input("colors.csv", CSVAdjusterTest.get_default_rows())
+
+        section = CSVAdjusterTest.get_section(self.readPath, self.writePath)
+        section['fileEncoding'] = 'utf-16'
+
+        with self.assertRaises(Exception):
+            adjuster.CSVAdjuster(self.load_config(section)).run()
+
+        self.assertEqual(os.listdir(self.writePath), [])
+
+        #The pipeline cuts blocks on newline bytes too
+        section['pipeline'] = True
+        with self.assertRaises(Exception):
+            adjuster.CSVAdjuster(self.load_config(section)).run()
+
+        self.assertEqual(os.listdir(self.writePath), [])
+
+    def test_reject_file(self):
+        """Verifies rows that fail to transform go to the reject file and the run carries on"""
+        self.write_input("colors.csv", CSVAdjusterTest.get_default_rows())
+
+        section = CSVAdjusterTest.get_section(self.readPath, self.writePath)
+        section['rejectFile'] = 'rejects.csv'
+        section['adjusts'][0]['transformers'] = [{"operation": "add", "columnNumber": 2, "value": 1}]
+
+        run = adjuster.CSVAdjuster(self.load_config(section))
+        run.run()
+
+        self.assertEqual(len(self.read_output("colors.csv")), 4)
+
+        rejects = self.read_output("rejects.csv")
+        self.assertEqual(len(rejects), 2)
+        self.assertEqual(rejects[0][:2], ["colors.csv", "2"])
+        self.assertEqual(rejects[0][3:], ["2", "Blue", "Blueberry"])
+        self.assertEqual(run.counters['rowsrejected'], 2)
+
+        #Record numbers start over for each file
+        self.write_input("more.csv", CSVAdjusterTest.get_default_rows()[1:])
+        adjuster.CSVAdjuster(self.load_config(section)).run()
+
+        rejects = self.read_output("rejects.csv")
+        self.assertEqual([reject[:2] for reject in rejects],
+                         [["colors.csv", "2"], ["colors.csv", "5"], ["more.csv", "1"], ["more.csv", "4"]])
+
+        #Without a reject file, the first bad row stops the run
+        del section['rejectFile']
+        with self.assertRaises(Exception):
+            adjuster.CSVAdjuster(self.load_config(section)).run()
+
+    def test_checkpoint_syncs_files_first(self):
+        """Verifies the output and reject files reach the disk before each checkpoint is saved"""
+        self.write_input("colors.csv", CSVAdjusterTest.get_default_rows())
+
+        section = CSVAdjusterTest.get_section(self.readPath, self.writePath)
+        section['checkpointInterval'] = 3
+        section['rejectFile'] = 'rejects.csv'
+
+        events = []
+        with mock.patch.object(adjuster.os, 'fsync', lambda fileno: events.append("fsync")), \
+                mock.patch.object(Checkpoint, 'save', lambda checkpoint: events.append("checkpoint")):
+            adjuster.CSVAdjuster(self.load_config(section)).run()
+
+        #Two checkpoints part way through the file and one when it is done
+        self.assertEqual(events, ["fsync", "fsync", "checkpoint"] * 3)
+
+    def test_sections_sharing_write_directory(self):
+        """Verifies sections writing to the same directory each keep their own checkpoint"""
+        otherReadPath = os.path.join(self.readPath, "other")
+        os.makedirs(otherReadPath)
+        self.write_input("a.csv", CSVAdjusterTest.get_default_rows()[:2])
+        with open(os.path.join(otherReadPath, "b.csv"), 'w', newline='') as fileHandle:
+            fileHandle.write("1,Blue,Sky\r\n")
+
+        first = CSVAdjusterTest.get_section(self.readPath, self.writePath)
+        first['checkpointInterval'] = 1
+        second = CSVAdjusterTest.get_section(otherReadPath, self.writePath)
+        second['checkpointInterval'] = 1
+
+        run = adjuster.CSVAdjuster(self.load_config([first, second]))
+        run.run()
+
+        self.assertEqual(run.counters['filescompleted'], 2)
+        self.assertEqual(run.counters['rowsread'], 3)
+        self.assertEqual(self.read_output("b.csv"), [["1", "Blue", "Sky!"]])
+        self.assertEqual(sorted(os.listdir(self.writePath)), ["a.csv", "b.csv"])
+
+    def test_sections_sharing_reject_file(self):
+        """Verifies a section naming a reject file an earlier section uses doesn't overwrite its rejects"""
+        otherReadPath = os.path.join(self.readPath, "other")
+        os.makedirs(otherReadPath)
+        self.write_input("a.csv", CSVAdjusterTest.get_default_rows())
+        with open(os.path.join(otherReadPath, "b.csv"), 'w', newline='') as fileHandle:
+            fileHandle.write("1,Blue,Sky\r\n")
+
+        sections = []
+        for readPath in [self.readPath, otherReadPath]:
+            section = CSVAdjusterTest.get_section(readPath, self.writePath)
+            section['rejectFile'] = 'rejects.csv'
+            section['adjusts'][0]['transformers'] = [{"operation": "add", "columnNumber": 2, "value": 1}]
+            sections.append(section)
+
+        adjuster.CSVAdjuster(self.load_config(sections)).run()
+
+        self.assertEqual([reject[:2] for reject in self.read_output("rejects.csv")],
+                         [["a.csv", "2"], ["a.csv", "5"]])
+        self.assertEqual([reject[:2] for reject in self.read_output("rejects.1.csv")], [["b.csv", "1"]])
+
+    def test_pipeline(self):
+        """Verifies the pipeline gives the same output as a single thread and reports how busy each stage was"""
+        rows = [[str(i), "Blue" if i % 3 == 0 else "Red", "Sky" * (i % 7)] for i in range(20000)]
+        rows[12345][2] = "\"quoted, late\""
+        self.write_input("big.csv", rows)
+
+        single = adjuster.CSVAdjuster(self.load_config())
+        single.run()
+        expected = self.read_output("big.csv")
+        self.assertEqual(single.get_stage_utilization(), dict())
+
+        section = CSVAdjusterTest.get_section(self.readPath, self.writePath)
+        section['pipeline'] = True
+        section['memoryBudget'] = 16384
+
+        run = adjuster.CSVAdjuster(self.load_config(section))
+        run.run()
+
+        self.assertEqual(self.read_output("big.csv"), expected)
+        self.assertEqual(run.counters['rowswritten'], 20000)
+        self.assertEqual(sorted(run.get_stage_utilization()), ["process", "read", "write"])
+
+    def test_resume_from_checkpoint(self):
+        """Verifies an interrupted run picks up from its last checkpoint and produces the same output"""
+        self.check_resume(CSVAdjusterTest.get_section(self.readPath, self.writePath))
+
+    def test_resume_from_checkpoint_pipelined(self):
+        """Same as test_resume_from_checkpoint, but the checkpoints are saved by the pipeline's writer stage"""
+        section = CSVAdjusterTest.get_section(self.readPath, self.writePath)
+        section['pipeline'] = True
+        self.check_resume(section)
+
+    def test_checkpoint_from_other_section(self):
+        """Verifies a checkpoint saved for another read directory, like after the csvs list was reordered, is
+        ignored instead of being resumed from"""
+        self.write_input("a.csv", CSVAdjusterTest.get_default_rows())
+
+        checkpoint = Checkpoint(self.writePath, 0)
+        checkpoint.readDirectory = os.path.abspath(os.path.join(self.readPath, "other"))
+        checkpoint.completedFiles = ["a.csv"]
+        checkpoint.save()
+
+        section = CSVAdjusterTest.get_section(self.readPath, self.writePath)
+        section['checkpointInterval'] = 2
+
+        run = adjuster.CSVAdjuster(self.load_config(section))
+        run.run()
+
+        self.assertEqual(run.counters['filescompleted'], 1)
+        self.assertEqual(self.read_output("a.csv")[1], ["2", "Blue", "Blueberry!"])
+        self.assertIsNone(Checkpoint.load(self.writePath, 0))
+
+    def check_resume(self, section):
+        self.write_input("a.csv", CSVAdjusterTest.get_default_rows())
+        self.write_input("b.csv", CSVAdjusterTest.get_default_rows())
+
+        section['checkpointInterval'] = 2
+
+        #Blow up part way through the second file
+        realTransform = plan.Adjust.transform
+        calls = []
+        def interrupt(adjust, row, results=None):
+            calls.append(row)
+            if len(calls) == 10:
+                raise KeyboardInterrupt()
+            return realTransform(adjust, row, results)
+
+        with mock.patch.object(plan.Adjust, 'transform', interrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                adjuster.CSVAdjuster(self.load_config(section)).run()
+
+        checkpoint = Checkpoint.load(self.writePath, 0)
+        self.assertEqual(checkpoint.completedFiles, ["a.csv"])
+        self.assertEqual(checkpoint.fileName, "b.csv")
+        self.assertEqual(checkpoint.counters['rowsread'], 8)
+        self.assertEqual(checkpoint.recordNumber, 2)
+        self.assertEqual(checkpoint.readDirectory, os.path.abspath(self.readPath))
+
+        run = adjuster.CSVAdjuster(self.load_config(section))
+        run.run()
+
+        self.assertEqual(self.read_output("a.csv"), self.read_output("b.csv"))
+        self.assertEqual(len(self.read_output("b.csv")), 6)
+        self.assertEqual(run.counters['rowsread'], 12)
+        self.assertEqual(run.counters['filescompleted'], 2)
+        self.assertIsNone(Checkpoint.load(self.writePath, 0))
+
+    def setUp(self):
+        """Creates empty read and write directories for each test"""
+        self.readPath = os.path.join(CSVAdjusterTest.__TEMP_PATH, "original")
+        self.writePath = os.path.join(CSVAdjusterTest.__TEMP_PATH, "changed")
+
+        for path in (self.readPath, self.writePath):
+            if os.path.exists(path):
+                shutil.rmtree(path)
+            os.makedirs(path)
+
+    @classmethod
+    def setUpClass(cls):
+        """Creates the temp directory"""
+        CSVAdjusterTest.__TEMP_PATH = os.path.join(os.getcwd(), "adjusterTestTempDir")
+
+        if not os.path.exists(CSVAdjusterTest.__TEMP_PATH):
+            os.makedirs(CSVAdjusterTest.__TEMP_PATH)
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the temp directory and everything in it"""
+        shutil.rmtree(CSVAdjusterTest.__TEMP_PATH)
+
+    def load_config(self, section=None):
+        """Writes out a config file with the csvs section, or list of sections, and loads it"""
+        if section is None:
+            section = CSVAdjusterTest.get_section(self.readPath, self.writePath)
+
+        sections = section if type(section) is list else [section]
+
+        testDict = {
+            "logging": {
+                "fileName": os.path.join(CSVAdjusterTest.__TEMP_PATH, "adjuster.log"),
+                "encoding": "utf-8",
+                "level": "INFO",
+                "format": "%(levelname)s %(message)s",
+                "fileMode": "a"
+            },
+            "csvs": sections
+        }
+
+        with open(os.path.join(CSVAdjusterTest.__TEMP_PATH, "testConfig.json"), 'w') as fileHandle:
+            fileHandle.write(json.dumps(testDict))
+
+        return config.CSVAdjustConfig(fileName="testConfig.json", path=CSVAdjusterTest.__TEMP_PATH)
+
+    def write_input(self, fileName, rows, delimiter=','):
+        with open(os.path.join(self.readPath, fileName), 'w', newline='') as fileHandle:
+            for row in rows:
+                fileHandle.write(delimiter.join(row) + '\r\n')
+
+    def read_output(self, fileName):
+        with open(os.path.join(self.writePath, fileName), 'r', newline='') as fileHandle:
+            return [line.split(',') for line in fileHandle.read().split('\r\n') if line]
+
+    @staticmethod
+    def get_section(readPath, writePath):
+        """Returns a csvs section that appends an exclamation mark to the third column of blue rows"""
+        return {
+            "readDirectory": readPath,
+            "writeDirectory": writePath,
+            "adjusts": [
+                {
+                    "conditionals": [
+                        {"type": "columnEquals", "columnNumber": 1, "value": "Blue"}
+                    ],
+                    "transformers": [
+                        {"operation": "append", "columnNumber": 2, "value": "!"}
+                    ]
+                }
+            ]
+        }
+
+    @staticmethod
+    def get_default_rows():
+        return [
+            ["1", "Red", "Apple"],
+            ["2", "Blue", "Blueberry"],
+            ["3", "Green", "Lime"],
+            ["4", "Yellow", "Banana"],
+            ["5", "Blue", "Sky"],
+            ["6", "Purple", "Grape"]
+        ]
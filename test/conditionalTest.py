@@ -41,15 +41,98 @@ class ConditionalTest(unittest.TestCase):
         
         self.assertFalse(contains.is_met(row))
         
+    def test_cached_conditional(self):
+        """Tests the cache in front of a column conditional"""
+        contains = conditional.ColumnContains(3, "ello")
+        cached = conditional.CachedConditional(contains, 2)
+        row = ConditionalTest.get_default_list()
+        
+        self.assertTrue(cached.is_met(row))
+        self.assertTrue(cached.is_met(row))
+        self.assertEqual((cached.hits, cached.misses), (1, 1))
+        
+        #False results get cached too
+        row[3] = "Grey"
+        self.assertFalse(cached.is_met(row))
+        self.assertFalse(cached.is_met(row))
+        self.assertEqual((cached.hits, cached.misses), (2, 2))
+        
+        #The oldest value is forgotten first
+        row[3] = "Cello"
+        self.assertTrue(cached.is_met(row))
+        self.assertEqual(list(cached.cache), ["Grey", "Cello"])
+        
+    def test_cached_conditional_turns_off(self):
+        """Verifies the cache turns off when it isn't getting hits"""
+        cached = conditional.CachedConditional(conditional.ColumnEquals(0, "7"), 100)
+        
+        for i in range(conditional.CachedConditional.SAMPLE_SIZE):
+            self.assertEqual(cached.is_met([str(i)]), i == 7)
+            
+        self.assertFalse(cached.enabled)
+        self.assertEqual(len(cached.cache), 0)
+        self.assertTrue(cached.is_met(["7"]))
+        self.assertEqual(len(cached.cache), 0)
+        
+    def test_conditional_groups(self):
+        """Tests the and, or and not groups"""
+        row = ConditionalTest.get_default_list()
+        blue = conditional.ColumnEquals(2, "Blue")
+        black = conditional.ColumnEquals(2, "Black")
+        
+        self.assertFalse(conditional.AndGroup([blue, black]).is_met(row))
+        self.assertTrue(conditional.OrGroup([blue, black]).is_met(row))
+        self.assertFalse(conditional.NotGroup([blue]).is_met(row))
+        self.assertTrue(conditional.NotGroup([black]).is_met(row))
+        
+        #Groups only check as many conditionals as they need to, and remember what they checked
+        results = dict()
+        self.assertTrue(conditional.OrGroup([blue, black]).evaluate(row, results))
+        self.assertIn(blue, results)
+        self.assertNotIn(black, results)
+        
+    def test_nested_conditional_parsing(self):
+        """Verifies groups are parsed and identical conditionals are only created once"""
+        testConfig = [
+            {
+                "type":"or",
+                "conditionals": [
+                    {"type":"columnequals", "columnnumber":2, "value":"Blue"},
+                    {"type":"not", "conditionals": [{"type":"rowcontains", "value":"urp"}]}
+                ]
+            },
+            {"type":"columnequals", "columnnumber":2, "value":"Blue"},
+            {"type":"columnequals", "columnnumber":2, "value":"Black"}
+        ]
+        
+        registry = dict()
+        conditionals = conditional.Conditional.parse_conditionals(testConfig, registry)
+        
+        self.assertEqual(type(conditionals[0]), conditional.OrGroup)
+        self.assertEqual(type(conditionals[0].conditionals[1]), conditional.NotGroup)
+        self.assertIs(conditionals[0].conditionals[0], conditionals[1])
+        self.assertIsNot(conditionals[1], conditionals[2])
+        
+        #The same registry shares whole groups too
+        again = conditional.Conditional.parse_conditionals(testConfig[:1], registry)
+        self.assertIs(again[0], conditionals[0])
+        
+        #Groups need their conditionals list
+        with self.assertRaises(Exception):
+            conditional.Conditional.parse_conditionals([{"type":"and"}])
+        
     def test_conditional_types_enum(self):
         """Tests for the ConditionalType enumeration"""
         conTypes = conditional.ConditionalType
         
-        self.assertEqual(3, len(conTypes))
+        self.assertEqual(6, len(conTypes))
         
         self.assertEqual(conTypes.get_type("columnequals"), conTypes.COLUMN_EQUALS)
         self.assertEqual(conTypes.get_type("columncontains"), conTypes.COLUMN_CONTAINS)
         self.assertEqual(conTypes.get_type("rowcontains"), conTypes.ROW_CONTAINS)
+        self.assertEqual(conTypes.get_type("AND"), conTypes.AND)
+        self.assertEqual(conTypes.get_type("or"), conTypes.OR)
+        self.assertEqual(conTypes.get_type("not"), conTypes.NOT)
         
     def test_conditional_parsing(self):
         testConfig = [
@@ -91,6 +174,31 @@ class ConditionalTest(unittest.TestCase):
         
         with self.assertRaises(Exception):
             conditional.Conditional.parse_conditionals(brokeConfig)
+            
+        #Caches can be asked for on column conditionals, but not on row conditionals
+        cachedConfig = [
+            {
+                "type":"columncontains",
+                "columnnumber":7,
+                "value":"Mango",
+                "cachesize":64
+            }
+        ]
+        
+        conditionals = conditional.Conditional.parse_conditionals(cachedConfig)
+        self.assertEqual(type(conditionals[0]), conditional.CachedConditional)
+        self.assertEqual(conditionals[0].size, 64)
+        
+        for cacheSize in ["8", 0, -1, 2.5, True]:
+            cachedConfig[0]["cachesize"] = cacheSize
+            with self.assertRaises(Exception):
+                conditional.Conditional.parse_conditionals(cachedConfig)
+        
+        cachedConfig[0]["cachesize"] = 64
+        cachedConfig[0]["type"] = "rowcontains"
+        
+        with self.assertRaises(Exception):
+            conditional.Conditional.parse_conditionals(cachedConfig)
         
 
     @staticmethod
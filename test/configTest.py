@@ -74,7 +74,7 @@ class CSVAdjustConfigTest(unittest.TestCase):
     def test_config_section_enum(self):
         """Verifies everything with the config section enumeration is fine"""
         Sec = config.ConfigSection
-        self.assertEqual(13, len(Sec))
+        self.assertEqual(21, len(Sec))
         
 
     #@unittest.skip("I don't think this is handling list correctly, and I don't want to work on it now")
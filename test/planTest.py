@@ -0,0 +1,187 @@
+import unittest, io, threading, tempfile
+
+from csvAdjust import AdjustPlan
+
+class AdjustPlanTest(unittest.TestCase):
+    """Tests for building and applying an AdjustPlan"""
+
+    def test_build_from_dict(self):
+        """Verifies a plan can be built from a whole config or a single section, with keys in any case"""
+        section = AdjustPlanTest.get_section()
+
+        self.assertEqual(len(AdjustPlan.build(section).adjusts), 1)
+        self.assertEqual(len(AdjustPlan.build({"CSVs": [{}, section]}, sectionIndex=1).adjusts), 1)
+        self.assertEqual(AdjustPlan.build(section).encoding, "utf-8")
+
+        #Bad settings are caught when the plan is built
+        with self.assertRaises(Exception):
+            AdjustPlan.build({"dialect": "notADialect"})
+
+        with self.assertRaises(Exception):
+            AdjustPlan.build({"fileEncoding": "notAnEncoding"})
+
+        with self.assertRaises(Exception):
+            AdjustPlan.build({"adjusts": [{"transformers": [{"operation": "divide", "columnNumber": 1, "value": 2}]}]})
+
+        with self.assertRaises(Exception):
+            AdjustPlan.build({"adjusts": [{"conditionalsBoolean": "XOR"}]})
+
+        self.assertEqual(len(AdjustPlan.build({"adjusts": [{"conditionalsBoolean": "or"}]}).adjusts), 1)
+
+    def test_apply_rows(self):
+        """Verifies rows are adjusted without changing the originals"""
+        plan = AdjustPlan.build(AdjustPlanTest.get_section())
+        rows = AdjustPlanTest.get_default_rows()
+
+        adjusted = list(plan.apply_rows(rows))
+
+        self.assertEqual(adjusted[0], ["1", "Red", "Apple"])
+        self.assertEqual(adjusted[1], ["2", "Blue", "Blueberry!"])
+        self.assertEqual(rows[1], ["2", "Blue", "Blueberry"])
+
+        #Blank lines come through as they are
+        self.assertEqual(list(plan.apply_rows([[], ["2", "Blue", "Sky"]])), [[], ["2", "Blue", "Sky!"]])
+
+    def test_apply_rejected(self):
+        """Verifies failing rows are handed to the rejected callback and left out"""
+        section = AdjustPlanTest.get_section()
+        section['adjusts'][0]['transformers'] = [{"operation": "add", "columnNumber": 2, "value": 1}]
+        plan = AdjustPlan.build(section)
+
+        rejects = []
+        adjusted = list(plan.apply_rows(AdjustPlanTest.get_default_rows(), lambda row, e: rejects.append(row)))
+
+        self.assertEqual(len(adjusted), 4)
+        self.assertEqual(rejects, [["2", "Blue", "Blueberry"], ["5", "Blue", "Sky"]])
+
+        with self.assertRaises(Exception):
+            list(plan.apply_rows(AdjustPlanTest.get_default_rows()))
+
+    def test_apply_bytes_and_files(self):
+        """Verifies bytes buffers, binary files and text files all give the same rows"""
+        plan = AdjustPlan.build(AdjustPlanTest.get_section())
+        data = "1,Red,Apple\r\n2,Blue,\"Blue,berry\"\r\n".encode("utf-8")
+        expected = [["1", "Red", "Apple"], ["2", "Blue", "Blue,berry!"]]
+
+        self.assertEqual(list(plan.apply_bytes(data)), expected)
+        self.assertEqual(list(plan.apply_file(io.BytesIO(data))), expected)
+        self.assertEqual(list(plan.apply_file(io.StringIO(data.decode("utf-8"), newline=''))), expected)
+
+        #File like objects that aren't io classes
+        for mode in ['w+b', 'w+']:
+            with tempfile.SpooledTemporaryFile(mode=mode, newline=None if 'b' in mode else '') as fileHandle:
+                fileHandle.write(data if 'b' in mode else data.decode("utf-8"))
+                fileHandle.seek(0)
+                self.assertEqual(list(plan.apply_file(fileHandle)), expected)
+
+    def test_apply_utf16(self):
+        """Verifies encodings that don't write ASCII as single bytes work on bytes and binary files"""
+        section = AdjustPlanTest.get_section()
+        section['fileEncoding'] = 'utf-16'
+        plan = AdjustPlan.build(section)
+        data = "1,Blue,Sky\r\n2,Red,Apple\r\n".encode("utf-16")
+        expected = [["1", "Blue", "Sky!"], ["2", "Red", "Apple"]]
+
+        self.assertEqual(list(plan.apply_bytes(data)), expected)
+
+        fileHandle = io.BytesIO(data)
+        self.assertEqual(list(plan.apply_file(fileHandle)), expected)
+        self.assertFalse(fileHandle.closed)
+
+    def test_shared_conditionals(self):
+        """Verifies a conditional used by several adjusts is checked once per row until the row is changed"""
+        blue = {"type": "columnEquals", "columnNumber": 1, "value": "Blue"}
+        section = {
+            "adjusts": [
+                {"conditionals": [blue, {"type": "columnContains", "columnNumber": 2, "value": "berry"}],
+                 "transformers": [{"operation": "append", "columnNumber": 2, "value": "!"}]},
+                {"conditionals": [{"type": "not", "conditionals": [blue]}],
+                 "transformers": [{"operation": "replace", "columnNumber": 1, "value": "Blue"}]},
+                {"conditionals": [blue],
+                 "transformers": [{"operation": "append", "columnNumber": 0, "value": "b"}]}
+            ]
+        }
+        plan = AdjustPlan.build(section)
+
+        shared = plan.adjusts[0].conditionals[0]
+        self.assertIs(plan.adjusts[1].conditionals[0].conditionals[0], shared)
+        self.assertIs(plan.adjusts[2].conditionals[0], shared)
+
+        calls = []
+        realIsMet = shared.is_met
+        shared.is_met = lambda row: calls.append(row) or realIsMet(row)
+
+        #Nothing changes the row, so blue is only checked once
+        self.assertEqual(list(plan.apply_rows([["5", "Blue", "Sky"]])), [["5b", "Blue", "Sky"]])
+        self.assertEqual(len(calls), 1)
+
+        #The second adjust makes the row blue, so the third has to check again
+        del calls[:]
+        self.assertEqual(list(plan.apply_rows([["1", "Red", "Apple"]])), [["1b", "Blue", "Apple"]])
+        self.assertEqual(len(calls), 2)
+
+    def test_auto_dialect(self):
+        """Verifies an auto dialect is sniffed from the first data the plan sees and then kept"""
+        section = AdjustPlanTest.get_section()
+        section['dialect'] = 'auto'
+        plan = AdjustPlan.build(section)
+
+        first = list(plan.apply_bytes(b"1;Blue;Sky\r\n2;Red;Apple\r\n3;Blue;Sea\r\n"))
+        self.assertEqual(first[0], ["1", "Blue", "Sky!"])
+
+        dialect = plan.get_dialect()
+        self.assertEqual(dialect.delimiter, ";")
+
+        #Later data doesn't get sniffed again
+        list(plan.apply_bytes(b"1;Blue;Sky\r\n"))
+        self.assertIs(plan.get_dialect(), dialect)
+
+        #The first data had no quotes, but later quotes are still read and written the excel way
+        self.assertEqual(list(plan.apply_bytes(b'1;Blue;"a""b"\r\n2;Red;5" screen\r\n')),
+                         [["1", "Blue", 'a"b!'], ["2", "Red", '5" screen']])
+
+    def test_shared_between_threads(self):
+        """Verifies one plan gives the same results when used from several threads at once"""
+        plan = AdjustPlan.build(AdjustPlanTest.get_section())
+        expected = list(plan.apply_rows(AdjustPlanTest.get_default_rows()))
+        results = []
+
+        def worker():
+            for i in range(200):
+                results.append(list(plan.apply_rows(AdjustPlanTest.get_default_rows())) == expected)
+
+        threads = [threading.Thread(target=worker) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(results), 800)
+        self.assertTrue(all(results))
+
+    @staticmethod
+    def get_section():
+        """Returns a csvs section that appends an exclamation mark to the third column of blue rows"""
+        return {
+            "adjusts": [
+                {
+                    "conditionals": [
+                        {"type": "columnEquals", "columnNumber": 1, "value": "Blue"}
+                    ],
+                    "transformers": [
+                        {"operation": "append", "columnNumber": 2, "value": "!"}
+                    ]
+                }
+            ]
+        }
+
+    @staticmethod
+    def get_default_rows():
+        return [
+            ["1", "Red", "Apple"],
+            ["2", "Blue", "Blueberry"],
+            ["3", "Green", "Lime"],
+            ["4", "Yellow", "Banana"],
+            ["5", "Blue", "Sky"],
+            ["6", "Purple", "Grape"]
+        ]
@@ -0,0 +1,46 @@
+import unittest, csv, io
+
+from csvAdjust import reader
+
+class ReaderTest(unittest.TestCase):
+    """Tests for the row reader and its fast path"""
+
+    def test_is_simple(self):
+        """Tests the check for quote and escape characters"""
+        self.assertTrue(reader.is_simple("a,b,c\r\n1,2,3\r\n", "excel"))
+        self.assertFalse(reader.is_simple("a,\"b\",c\r\n", "excel"))
+        self.assertTrue(reader.is_simple("a\tb\r\n", "excel-tab"))
+
+        #Quotes don't matter when the dialect doesn't use them, but escapes do
+        csv.register_dialect("readerTestNoQuote", quoting=csv.QUOTE_NONE, escapechar="\\")
+        try:
+            self.assertTrue(reader.is_simple("a,\"b\"\r\n", "readerTestNoQuote"))
+            self.assertFalse(reader.is_simple("a,b\\,c\r\n", "readerTestNoQuote"))
+        finally:
+            csv.unregister_dialect("readerTestNoQuote")
+
+        #Dialects that change unquoted fields always use the csv module
+        csv.register_dialect("readerTestSpace", skipinitialspace=True)
+        try:
+            self.assertFalse(reader.is_simple("a, b\r\n", "readerTestSpace"))
+        finally:
+            csv.unregister_dialect("readerTestSpace")
+
+    def test_fast_path_matches_csv(self):
+        """Verifies the fast path gives the same rows as the csv module, including after falling back"""
+        text = "1,Red,Apple\r\n\r\n2,,Lime\n3,Blue,\"Sky,\r\nand sea\"\r\n4,Green,Pea\r\n"
+
+        expected = list(csv.reader(io.StringIO(text, newline='')))
+        fast = list(reader.read_rows(io.StringIO(text, newline=''), "excel", True))
+
+        self.assertEqual(fast, expected)
+        self.assertEqual(fast[3], ["3", "Blue", "Sky,\r\nand sea"])
+
+    def test_sample_lines(self):
+        """Verifies the sample is taken without losing any lines"""
+        lines = ["a,b\r\n", "c,d\r\n", "e,f\r\n"]
+
+        sample, rest = reader.sample_lines(lines, size=6)
+
+        self.assertEqual(sample, "a,b\r\nc,d\r\n")
+        self.assertEqual(list(rest), lines)
@@ -19,6 +19,45 @@ class TransformerTest(unittest.TestCase):
             
         self.assertEqual(len(transformer.Add.get_required_fields()), 2)
         
+    def test_number_transformers_on_text(self):
+        """Verifies numbers read from a CSV as text are parsed, and the result goes back as text"""
+        row = ["7", "2.5", "-3", "seven"]
+        
+        transformer.Add(0, 6).transform(row)
+        transformer.Add(1, 1).transform(row)
+        transformer.Subtract(2, 2).transform(row)
+        
+        self.assertEqual(row[:3], ["13", "3.5", "-5"])
+        
+        with self.assertRaises(transformer.TransformError):
+            transformer.Subtract(3, 1).transform(row)
+        
+        #The decimal places and padding of the cell are kept, and nothing is lost to floating point
+        row = ["0.1", "19.99", "007", "1.50"]
+        
+        transformer.Add(0, 0.2).transform(row)
+        transformer.Add(1, 0.01).transform(row)
+        transformer.Add(2, 1).transform(row)
+        transformer.Subtract(3, 0.5).transform(row)
+        
+        self.assertEqual(row, ["0.3", "20.00", "008", "1.00"])
+        
+        #Forms Python would take, but that aren't numbers in a CSV
+        for cell in ["1_000", "NaN", "inf", ""]:
+            with self.assertRaises(transformer.TransformError):
+                transformer.Add(0, 1).transform([cell])
+        
+    def test_parse_transformers(self):
+        """Verifies the value of an arithmetic operation has to be a number"""
+        transformers = transformer.Transformer.parse_transformers(
+            [{"operation": "add", "columnnumber": 0, "value": 10}, {"operation": "append", "columnnumber": 0, "value": "10"}])
+        
+        self.assertEqual(len(transformers), 2)
+        
+        for value in ["10", True, None, float("nan")]:
+            with self.assertRaises(Exception):
+                transformer.Transformer.parse_transformers([{"operation": "subtract", "columnnumber": 0, "value": value}])
+        
     def test_subtract_transformer(self):
         """Tests the subtract transformer"""
         row = TransformerTest.get_default_number_list()